@@ -1,21 +1,28 @@
-import base64
-import time
-from dataclasses import dataclass
-from io import BytesIO
+from dataclasses import dataclass, field
 from typing import List
 
 import streamlit as st
-from PIL import Image
 
-from streamlit_chat_prompt import PromptReturn, prompt
+from streamlit_chat_prompt import FileData, PromptReturn, prompt
 
 st.title("streamlit-chat-prompt")
 
 
+@dataclass
+class ChatImage:
+    type: str
+    data: bytes
+
+
+def to_chat_image(image: FileData) -> ChatImage:
+    return ChatImage(type=image.type, data=image.bytes)
+
+
 @dataclass
 class ChatMessage:
     role: str
-    content: str | PromptReturn
+    content: str
+    images: List[ChatImage] = field(default_factory=list)
 
 
 if "default_chat_input" not in st.session_state:
@@ -38,9 +45,8 @@ def dialog(default_input: str | PromptReturn | None = None, key="default_dialog_
         default=default_input,
     )
     if dialog_input:
-        st.write(dialog_input)
         st.session_state.default_chat_input = dialog_input
-        time.sleep(2)
+        st.toast("Saved as default prompt", icon="✅")
         st.rerun()
 
 
@@ -56,28 +62,20 @@ with st.sidebar:
     if st.button("Dialog Prompt", key=f"dialog_prompt_button"):
         dialog()
 
-for chat_message in st.session_state.messages:
-    chat_message: ChatMessage
-
-    with st.chat_message(chat_message.role):
-        if isinstance(chat_message.content, PromptReturn):
-            st.markdown(chat_message.content.text)
-            if chat_message.content.images:
-                for image_data in chat_message.content.images:
-                    st.divider()
-                    st.markdown("Using `st.markdown`")
-                    st.markdown(
-                        f"![Image example](data:{image_data.type};{image_data.format},{image_data.data})"
-                    )
-
-                    # or use PIL
-                    st.divider()
-                    st.markdown("Using `st.image`")
-                    image = Image.open(BytesIO(base64.b64decode(image_data.data)))
-                    st.image(image)
-
-        else:
+
+@st.fragment
+def render_history():
+    for chat_message in st.session_state.messages:
+        chat_message: ChatMessage
+
+        with st.chat_message(chat_message.role):
             st.markdown(chat_message.content)
+            for image_data in chat_message.images:
+                st.divider()
+                st.image(image_data.data)
+
+
+render_history()
 
 prompt_return: PromptReturn | None = prompt(
     name="foo",
@@ -89,7 +87,13 @@ prompt_return: PromptReturn | None = prompt(
 )
 
 if prompt_return:
-    st.session_state.messages.append(ChatMessage(role="user", content=prompt_return))
+    st.session_state.messages.append(
+        ChatMessage(
+            role="user",
+            content=prompt_return.text or "",
+            images=[to_chat_image(image) for image in prompt_return.images],
+        )
+    )
     st.session_state.messages.append(
         ChatMessage(role="assistant", content=f"Echo: {prompt_return.text}")
     )
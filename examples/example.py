@@ -1,11 +1,19 @@
-import base64
-import uuid
-from dataclasses import dataclass
+try:
+    import pybase64 as base64  # SIMD-accelerated drop-in replacement
+except ImportError:
+    import base64
+import hashlib
+from dataclasses import dataclass, field
+from functools import cached_property
 from io import BytesIO
-from typing import List
+from typing import Dict, List
 
 import streamlit as st
-from PIL import Image
+
+try:
+    import simplejpeg  # libjpeg-turbo bindings, used for fast JPEG thumbnails
+except ImportError:
+    simplejpeg = None
 
 from streamlit_chat_prompt import (
     DEFAULT_DOCUMENT_COUNT, DEFAULT_DOCUMENT_FILE_SIZE,
@@ -16,10 +24,119 @@ from streamlit_chat_prompt import (
 st.title("streamlit-chat-prompt")
 
 
+# longest edge, in pixels, of the image previews shown in the chat history
+THUMBNAIL_SIZE = 512
+
+
+def jpeg_thumbnail(data: bytes) -> bytes:
+    """JPEG preview decoded at reduced scale by libjpeg-turbo, or the image if small"""
+    height, width, _, _ = simplejpeg.decode_jpeg_header(data)
+    scale = THUMBNAIL_SIZE / max(height, width)
+    if scale >= 1:
+        return data
+    # libjpeg scales by 1/2, 1/4 or 1/8 during the IDCT, so this skips most of
+    # the decode work; the result is at most twice THUMBNAIL_SIZE, so finish
+    # with a cheap resize of the already reduced pixels
+    pixels = simplejpeg.decode_jpeg(
+        data,
+        colorspace="RGB",
+        min_height=int(height * scale),
+        min_width=int(width * scale),
+    )
+    from PIL import Image
+
+    im = Image.fromarray(pixels)
+    im.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+    out = BytesIO()
+    im.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+@dataclass
+class ChatFile:
+    """A submitted file, kept decoded so history renders never touch base64"""
+
+    type: str
+    data: bytes
+    name: str | None = None
+
+    @cached_property
+    def data_url(self) -> str:
+        return f"data:{self.type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+    @cached_property
+    def thumbnail(self) -> bytes:
+        """Downscaled preview of an image, or the image itself if already small"""
+        if simplejpeg is not None and self.type == "image/jpeg":
+            try:
+                return jpeg_thumbnail(self.data)
+            except ValueError:
+                pass  # e.g. CMYK JPEGs, which libjpeg-turbo can't decode to RGB
+
+        from PIL import Image
+
+        with Image.open(BytesIO(self.data)) as im:
+            if max(im.size) <= THUMBNAIL_SIZE:
+                return self.data
+            # thumbnail() first, while the image is still unloaded: for JPEGs its
+            # reducing_gap lets Pillow draft() a DCT-scaled decode
+            im.thumbnail(
+                (THUMBNAIL_SIZE, THUMBNAIL_SIZE),
+                Image.Resampling.LANCZOS,
+                reducing_gap=2.0,
+            )
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA")
+            buf = BytesIO()
+            im.save(buf, "PNG")
+        return buf.getvalue()
+
+
+# Only lossless uploads are worth transcoding: re-encoding a JPEG or WebP takes
+# seconds on the script thread and rarely comes out smaller
+TRANSCODED_IMAGE_TYPES = ("image/png", "image/bmp")
+
+
+def compress_image(data: bytes) -> bytes:
+    """Transcode an image to WebP for history retention"""
+    # imported lazily so text-only sessions never load Pillow
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as im:
+        buf = BytesIO()
+        # method=2 is several times faster than the default with near-equal size
+        im.save(buf, "WEBP", quality=90, method=2)
+    return buf.getvalue()
+
+
+def load_file(file_data: FileData) -> ChatFile:
+    data = file_data.bytes
+    # only keep the WebP if it is actually smaller
+    if file_data.type in TRANSCODED_IMAGE_TYPES:
+        compressed = compress_image(data)
+        if len(compressed) < len(data):
+            return ChatFile(type="image/webp", data=compressed, name=file_data.name)
+    return ChatFile(type=file_data.type, data=data, name=file_data.name)
+
+
+def store_file(file_data: FileData) -> str:
+    """Add a submitted file to the file store and return its id
+
+    Identical uploads share one entry, keyed by a hash of the payload, so they
+    are decoded, transcoded and thumbnailed only once (keeping the first name).
+    """
+    file_id = hashlib.blake2b(file_data.data.encode("ascii"), digest_size=16).hexdigest()
+    file_store: Dict[str, ChatFile] = st.session_state.file_store
+    if file_id not in file_store:
+        file_store[file_id] = load_file(file_data)
+    return file_id
+
+
 @dataclass
 class ChatMessage:
     role: str
-    content: str | PromptReturn
+    content: str
+    file_ids: List[str] = field(default_factory=list)
 
 
 if "messages" not in st.session_state:
@@ -28,6 +145,25 @@ if "messages" not in st.session_state:
     ]
     st.session_state.messages = messages
 
+if "file_store" not in st.session_state:
+    st.session_state.file_store = {}
+
+
+@st.cache_resource(show_spinner=False)
+def load_file_b64(path: str) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
+
+
+def summarize(prompt_return: PromptReturn) -> dict:
+    """JSON view of a prompt return with the base64 payloads elided"""
+    summary = prompt_return.model_dump(exclude={"files"})
+    summary["files"] = [
+        {**f.model_dump(exclude={"data"}), "data": f"<{len(f.data)} base64 chars>"}
+        for f in prompt_return.files or []
+    ]
+    return summary
+
 
 @st.dialog("Prompt in dialog")
 def dialog(default_input: str | PromptReturn | None = None, key="default_dialog_key"):
@@ -39,7 +175,7 @@ def dialog(default_input: str | PromptReturn | None = None, key="default_dialog_
         default=default_input,
     )
     if dialog_input:
-        st.write(dialog_input)
+        st.json(summarize(dialog_input))
 
 
 with st.sidebar:
@@ -48,28 +184,29 @@ with st.sidebar:
     if st.button("Dialog Prompt", key="dialog_prompt_button"):
         dialog()
 
+    # re-ships every image as a base64 data URL, so it is off by default
+    st.toggle("Also render images with `st.markdown`", key="markdown_images")
+
     if st.button(
         "Dialog Prompt with Default Value", key="dialog_prompt_with_default_button"
     ):
         # Read PDF file
         example_filename = "pdf-without-images.pdf"
-        with open(f"../example_files/{example_filename}", "rb") as f:
-            pdf_data = f.read()
-            base64_pdf = base64.b64encode(pdf_data).decode("utf-8")
-            dialog(
-                default_input=PromptReturn(
-                    text="This is a test message with a PDF",
-                    files=[
-                        FileData(
-                            data=base64_pdf,
-                            type="application/pdf",
-                            format="base64",
-                            name=example_filename,
-                        )
-                    ],
-                ),
-                key="dialog_with_default",
-            )
+        base64_pdf = load_file_b64(f"../example_files/{example_filename}")
+        dialog(
+            default_input=PromptReturn(
+                text="This is a test message with a PDF",
+                files=[
+                    FileData(
+                        data=base64_pdf,
+                        type="application/pdf",
+                        format="base64",
+                        name=example_filename,
+                    )
+                ],
+            ),
+            key="dialog_with_default",
+        )
 
     # Controls for file limits in an expandable section
     with st.expander("File Upload Limits", expanded=False):
@@ -120,57 +257,84 @@ with st.sidebar:
         max_document_count = DEFAULT_DOCUMENT_COUNT
 
 
-for chat_message in st.session_state.messages:
-    chat_message: ChatMessage
+# only the most recent messages are rendered on every rerun
+VISIBLE_MESSAGES = 20
+
+
+def render_image(key: str, file_data: ChatFile):
+    # the full-size image is only shipped to the browser on request
+    if st.toggle("Full size", key=f"full_size_{key}"):
+        st.image(file_data.data)
+    else:
+        st.image(file_data.thumbnail)
+    if st.session_state.get("markdown_images"):
+        st.markdown(f"![Image example]({file_data.data_url})")
+
+
+def render_pdf(key: str, file_data: ChatFile):
+    st.markdown("PDF File:")
+    st.markdown(f"Filename: {file_data.name}")
+    st.download_button(
+        label=f"Download {file_data.name}",
+        data=file_data.data,
+        file_name=file_data.name,
+        mime=file_data.type,
+        key=f"download_{key}",
+    )
+
+
+def render_markdown(key: str, file_data: ChatFile):
+    st.markdown("Markdown File:")
+    st.markdown(f"Filename: {file_data.name}")
 
+    # preview markdown content, only decoded and rendered when opened
+    if st.toggle("Preview", key=f"preview_{key}"):
+        with st.container(border=True):
+            st.markdown(file_data.data.decode("utf-8"))
+
+    st.download_button(
+        label=f"Download {file_data.name}",
+        data=file_data.data,
+        file_name=file_data.name,
+        mime=file_data.type,
+        key=f"download_{key}",
+    )
+
+
+# images are matched by prefix in render_message, everything else by exact type
+FILE_RENDERERS = {
+    "application/pdf": render_pdf,
+    "text/markdown": render_markdown,
+}
+
+
+def render_message(i: int, chat_message: ChatMessage):
     with st.chat_message(chat_message.role):
-        if isinstance(chat_message.content, PromptReturn):
-            st.markdown(chat_message.content.text)
-            if chat_message.content.files:  # Change from images to files
-                for file_data in chat_message.content.files:
-                    st.divider()
-                    if file_data.type.startswith("image/"):
-                        # Handle images as before
-                        st.markdown("Using `st.markdown`")
-                        st.markdown(
-                            f"![Image example](data:{file_data.type};{file_data.format},{file_data.data})"
-                        )
-
-                        st.divider()
-                        st.markdown("Using `st.image`")
-                        image = Image.open(BytesIO(base64.b64decode(file_data.data)))
-                        st.image(image)
-                    elif file_data.type == "application/pdf":
-                        st.markdown("PDF File:")
-                        st.markdown(f"Filename: {file_data.name}")
-                        pdf_bytes = BytesIO(base64.b64decode(file_data.data))
-                        st.download_button(
-                            label=f"Download {file_data.name}",
-                            data=pdf_bytes,
-                            file_name=file_data.name,
-                            mime=file_data.type,
-                            key=f"download_{file_data.type}_{uuid.uuid4()}",
-                        )
-                    elif file_data.type == "text/markdown":
-                        st.markdown("Markdown File:")
-                        st.markdown(f"Filename: {file_data.name}")
-                        md_bytes = BytesIO(base64.b64decode(file_data.data))
-
-                        # preview markdown content
-                        with st.expander("Preview"):
-                            md_content = md_bytes.getvalue().decode("utf-8")
-                            st.markdown(md_content)
-
-                        md_bytes.seek(0)  # Reset buffer position for download
-                        st.download_button(
-                            label=f"Download {file_data.name}",
-                            data=md_bytes,
-                            file_name=file_data.name,
-                            mime=file_data.type,
-                            key=f"download_{file_data.type}_{uuid.uuid4()}",
-                        )
-        else:
-            st.markdown(chat_message.content)
+        st.markdown(chat_message.content)
+        file_store: Dict[str, ChatFile] = st.session_state.file_store
+        for j, file_id in enumerate(chat_message.file_ids):
+            file_data = file_store[file_id]
+            st.divider()
+            renderer = FILE_RENDERERS.get(file_data.type)
+            if renderer is None and file_data.type.startswith("image/"):
+                renderer = render_image
+            if renderer is not None:
+                renderer(f"{i}_{j}", file_data)
+
+
+@st.fragment
+def render_history():
+    messages: List[ChatMessage] = st.session_state.messages
+    hidden = max(len(messages) - VISIBLE_MESSAGES, 0)
+    # a closed st.expander still runs its body, so gate older messages on a toggle
+    if hidden and st.toggle(f"Show earlier messages ({hidden})", key="show_earlier_messages"):
+        for i in range(hidden):
+            render_message(i, messages[i])
+    for i in range(hidden, len(messages)):
+        render_message(i, messages[i])
+
+
+render_history()
 
 # Show Bedrock validation status for submitted prompt
 if "last_validation_result" not in st.session_state:
@@ -191,7 +355,13 @@ prompt_return: PromptReturn | None = prompt(
 )
 
 if prompt_return:
-    st.session_state.messages.append(ChatMessage(role="user", content=prompt_return))
+    st.session_state.messages.append(
+        ChatMessage(
+            role="user",
+            content=prompt_return.text or "",
+            file_ids=[store_file(f) for f in prompt_return.files or []],
+        )
+    )
     st.session_state.messages.append(
         ChatMessage(role="assistant", content=f"Echo:\n\n{prompt_return.text}")
     )
@@ -1,11 +1,17 @@
+import functools
 import logging
 import os
-from typing import List, Optional, Union, Literal
+from typing import List, Optional, Tuple, Union, Literal
 
 import streamlit as st
 import streamlit.components.v1 as components
 from pydantic import BaseModel
 
+try:
+    from pybase64 import b64decode  # SIMD-accelerated, installed with the "fast" extra
+except ImportError:
+    from base64 import b64decode
+
 # Create a _RELEASE constant. We'll set this to False while we're developing
 # the component, and True when we're ready to package and distribute it.
 # (This is, of course, optional - there are innumerable ways to manage your
@@ -13,12 +19,18 @@ from pydantic import BaseModel
 _RELEASE = True
 
 logger = logging.getLogger("streamlit_chat_prompt")
-logger.setLevel(logging.WARN)
-handler = logging.StreamHandler()
-handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+_log_level = logging.getLevelName(
+    os.environ.get("STREAMLIT_CHAT_PROMPT_LOG", "WARNING").upper()
 )
-logger.addHandler(handler)
+# getLevelName returns a "Level ..." string for names it does not know
+logger.setLevel(_log_level if isinstance(_log_level, int) else logging.WARNING)
+# Streamlit can re-import this module, so only attach our handler once
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    logger.addHandler(handler)
 
 # set default limits for file uploads
 DEFAULT_IMAGE_FILE_SIZE = 5 * 1024 * 1024  # 5MB
@@ -38,6 +50,8 @@ DEFAULT_DOCUMENT_COUNT = 5
 # your component frontend. Everything else we do in this file is simply a
 # best practice.
 
+_BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "build")
+
 if not _RELEASE:
     _component_func = components.declare_component(
         # We give the component a simple, descriptive name ("my_component"
@@ -53,10 +67,8 @@ else:
     # When we're distributing a production version of the component, we'll
     # replace the `url` param with `path`, and point it to the component's
     # build directory:
-    parent_dir = os.path.dirname(os.path.abspath(__file__))
-    build_dir = os.path.join(parent_dir, "frontend/build")
     _component_func = components.declare_component(
-        "streamlit_chat_prompt", path=build_dir
+        "streamlit_chat_prompt", path=_BUILD_DIR
     )
 
 
@@ -72,6 +84,16 @@ class FileData(BaseModel):
     def is_image(self) -> bool:
         return self.type.startswith('image/')
 
+    @property
+    def data_url(self) -> str:
+        """The file as a `data:` URL"""
+        return f"data:{self.type};{self.format},{self.data}"
+
+    @property
+    def bytes(self) -> bytes:
+        """The decoded file contents; decoded on each access, so keep the result"""
+        return b64decode(self.data)
+
     @property
     def is_document(self) -> bool:
         return not self.is_image
@@ -82,19 +104,22 @@ class PromptReturn(BaseModel):
     files: Optional[List[FileData]] = None
     uuid: Optional[str] = None
 
+    def _split_files(self) -> Tuple[List[FileData], List[FileData]]:
+        """Split files into images and documents in a single pass"""
+        images, documents = [], []
+        for f in self.files or ():
+            (images if f.is_image else documents).append(f)
+        return images, documents
+
     @property
     def images(self) -> List[FileData]:
         """Maintain backward compatibility for images access"""
-        if not self.files:
-            return []
-        return [f for f in self.files if f.is_image]
+        return self._split_files()[0]
 
     @property
     def documents(self) -> List[FileData]:
         """Helper to get non-image files"""
-        if not self.files:
-            return []
-        return [f for f in self.files if f.is_document]
+        return self._split_files()[1]
 
 
 __all__ = ["prompt", "PromptReturn", "FileData",
@@ -103,45 +128,144 @@ __all__ = ["prompt", "PromptReturn", "FileData",
 
 _prompt_main_singleton_key: Optional[str] = None
 
+# mirrors SUPPORTED_FILE_TYPES in frontend/src/components/Types.tsx
+_MIME_TO_FILE_TYPE = {
+    "application/pdf": "pdf",
+    "text/markdown": "markdown",
+    "text/x-markdown": "markdown",
+    "text/plain": "markdown",
+    "application/x-markdown": "markdown",
+}
+
+
+def _file_type_for(mime: str) -> Optional[str]:
+    if mime.startswith("image/"):
+        return "image"
+    return _MIME_TO_FILE_TYPE.get(mime)
+
+
+def _parse_data_url(url: str) -> Tuple[str, str, str]:
+    """Split a `data:<type>;<format>,<data>` URL without scanning past its header"""
+    header, _, data = url.partition(",")
+    media_type, _, data_format = header.partition(";")
+    return media_type.partition(":")[2], data_format, data
+
+
+def _b64_decoded_size(data: str) -> int:
+    """Size in bytes of the decoded payload, computed from the base64 length alone"""
+    padding = 2 if data.endswith("==") else 1 if data.endswith("=") else 0
+    return (len(data) // 4) * 3 - padding
+
+
+def _file_from_component(file_data: Union[str, dict]) -> FileData:
+    """Build a FileData from a data URL string or a dict sent by the frontend"""
+    if isinstance(file_data, str):
+        file_type, file_format, data = _parse_data_url(file_data)
+        return FileData.model_construct(
+            type=file_type,
+            format=file_format,
+            data=data,
+            name=None,
+            size=_b64_decoded_size(data),
+            file_type=_file_type_for(file_type),
+        )
+
+    file = FileData.model_construct(**file_data)
+    if file.size is None:
+        file.size = _b64_decoded_size(file.data)
+    if file.file_type is None:
+        file.file_type = _file_type_for(file.type)
+    return file
 
-def pin_bottom(key: str):
-    # pin prompt to bottom of main area
-    st.markdown(
-        f"""
+
+def _default_value(default: Optional[Union[str, PromptReturn]]) -> Optional[dict]:
+    """Convert a prompt default into the value the frontend expects"""
+    # Convert string default to PromptReturn if needed
+    if isinstance(default, str):
+        default = PromptReturn.model_construct(text=default)
+    if not default:
+        return None
+
+    processed_files = []
+
+    # images are a subset of files, so a single pass covers both
+    if default.files:
+        for file in default.files:
+            processed_files.append(
+                {
+                    "type": file.type,
+                    "format": file.format,
+                    "data": file.data,
+                    "name": getattr(file, "name", None) or "file",
+                }
+            )
+
+    return {
+        "text": default.text or "",
+        "files": processed_files,
+        "uuid": None,  # No UUID for default value
+    }
+
+
+@functools.lru_cache(maxsize=16)
+def _upload_limits(
+    max_image_file_size: int,
+    max_image_count: int,
+    max_image_pixel_dimension: int,
+    max_document_file_size: int,
+    max_document_count: int,
+) -> Tuple[dict, dict]:
+    """Image and document limits as sent to the frontend, shared across reruns"""
+    image_file_upload_limits = {
+        "max_size_in_bytes": max_image_file_size,
+        "max_count": max_image_count,
+        "max_dimension_in_pixels": max_image_pixel_dimension,
+    }
+    document_file_upload_limits = {
+        "max_size_in_bytes": max_document_file_size,
+        "max_count": max_document_count,
+    }
+    return image_file_upload_limits, document_file_upload_limits
+
+
+_PIN_BOTTOM_CSS_TEMPLATE = """
         <style>
-        .st-key-{key}"""
-        + """ {
+        .st-key-{key} {{
             position: fixed;
             bottom: 1rem;
             z-index: 1000;
-        }
+        }}
 
         /* Main content area */
-        section[data-testid="stMain"] {
+        section[data-testid="stMain"] {{
             margin-bottom: 100px;  /* Make room for the fixed component */
-        }
+        }}
 
         /* When sidebar is expanded */
-        """
-        + f""".sidebar-expanded .st-key-{key}"""
-        + """ {
+        .sidebar-expanded .st-key-{key} {{
             left: calc((100% - 245px) / 2 + 245px);  /* 245px is default sidebar width */
             width: calc(min(800px, 100% - 245px - 2rem)) !important;
             transform: translateX(-50%);
-        }
+        }}
 
         /* When sidebar is collapsed */
-        """
-        + f""".sidebar-collapsed .st-key-{key}"""
-        + """ {
+        .sidebar-collapsed .st-key-{key} {{
             left: 50%;
             width: calc(min(800px, 100% - 2rem)) !important;
             transform: translateX(-50%);
-        }
+        }}
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+
+
+@functools.lru_cache(maxsize=None)
+def _pin_bottom_css(key: str) -> str:
+    return _PIN_BOTTOM_CSS_TEMPLATE.format(key=key)
+
+
+def pin_bottom(key: str):
+    # pin prompt to bottom of main area
+    st.markdown(_pin_bottom_css(key), unsafe_allow_html=True)
 
 
 # Create a wrapper function for the component. This is an optional
@@ -191,71 +315,37 @@ def prompt(
             - images (Optional[List[FileData]]): List of images only (convenience property)
             - documents (Optional[List[FileData]]): List of non-image files (convenience property)
     """
+    # lazy %-formatting: default may carry megabytes of base64 we don't want to
+    # stringify on every rerun when debug logging is off
     logger.debug(
-        f"Creating prompt: name={name}, key={key}, placeholder={placeholder}, default={default}, main_bottom={main_bottom}"
+        "Creating prompt: name=%s, key=%s, placeholder=%s, default=%s, main_bottom=%s",
+        name, key, placeholder, default, main_bottom,
     )
-    # Convert string default to PromptReturn if needed
-    if isinstance(default, str):
-        default = PromptReturn(text=default)
-
-    if f"chat_prompt_{key}_prev_uuid" not in st.session_state:
-        st.session_state[f"chat_prompt_{key}_prev_uuid"] = None
-
-    # Convert images to base64 strings if present in default
-    default_value = None
-    if default:
-        processed_files = []
-
-        # Handle legacy images
-        if default.images:
-            for img in default.images:
-                processed_files.append(
-                    {
-                        "data": f"data:{img.type};{img.format},{img.data}",
-                        "type": img.type,
-                        "name": "image",
-                    }
-                )
-
-        # Handle new files
-        if default.files:
-            for file in default.files:
-                processed_files.append(
-                    {
-                        "data": f"data:{file.type};{file.format},{file.data}",
-                        "type": file.type,
-                        "name": getattr(file, "name", None) or "file",
-                    }
-                )
-
-        default_value = {
-            "text": default.text or "",
-            "files": processed_files,
-            "uuid": None,  # No UUID for default value
-        }
+    # built on every run so in-place edits to the default are picked up; this
+    # only references the existing payload strings, it never copies them
+    default_value = _default_value(default)
 
     if main_bottom:
         global _prompt_main_singleton_key
 
-        if _prompt_main_singleton_key and _prompt_main_singleton_key != key:
-            raise RuntimeError(
-                "Multiple prompt instances detected. Only one prompt component can be used per Streamlit app. "
-                "Please ensure you're only creating a single prompt instance in your application."
-            )
-        _prompt_main_singleton_key = key
+        # only the first call for a key (per process) needs to register it
+        if _prompt_main_singleton_key != key:
+            if _prompt_main_singleton_key:
+                raise RuntimeError(
+                    "Multiple prompt instances detected. Only one prompt component can be used per Streamlit app. "
+                    "Please ensure you're only creating a single prompt instance in your application."
+                )
+            _prompt_main_singleton_key = key
 
         pin_bottom(key)
 
-    image_file_upload_limits = {
-        "max_size_in_bytes": max_image_file_size,
-        "max_count": max_image_count,
-        "max_dimension_in_pixels": max_image_pixel_dimension,
-    }
-
-    document_file_upload_limits = {
-        "max_size_in_bytes": max_document_file_size,
-        "max_count": max_document_count,
-    }
+    image_file_upload_limits, document_file_upload_limits = _upload_limits(
+        max_image_file_size,
+        max_image_count,
+        max_image_pixel_dimension,
+        max_document_file_size,
+        max_document_count,
+    )
 
     # Call through to our private component function. Arguments we pass here
     # will be sent to the frontend, where they'll be available in an "args"
@@ -274,66 +364,29 @@ def prompt(
         debug=log_level,
         clipboard_inspector_enabled=enable_clipboard_inspector,
     )
-    logger.debug(f"prompt value: {component_value}")
-
-    if (
-        component_value
-        and component_value["uuid"] != st.session_state[f"chat_prompt_{key}_prev_uuid"]
-        and component_value["uuid"] is not None
-    ):
-        # we have a new prompt return
-        st.session_state[f"chat_prompt_{key}_prev_uuid"] = component_value["uuid"]
-        processed_files = []
-        processed_images = []  # Separate list for images
-
-        # Process any files
-        if component_value.get("files"):
-            for file_data in component_value["files"]:
-                if isinstance(file_data, str):  # If it's a data URL string
-                    parts = file_data.split(";")
-                    file_type = parts[0].split(":")[1]
-                    file_format = parts[1].split(",")[0]
-                    file_data_content = parts[1].split(",")[1]
-
-                    file = FileData(
-                        type=file_type,
-                        format=file_format,
-                        data=file_data_content,
-                        name=None
-                    )
-
-                    processed_files.append(file)
-
-                    # If it's an image, also add to images list
-                    if file_type.startswith('image/'):
-                        processed_images.append(FileData(
-                            type=file_type,
-                            format=file_format,
-                            data=file_data_content,
-                            name=None
-                        ))
-
-                else:  # If it's already a dictionary
-                    file = FileData(**file_data)
-                    processed_files.append(file)
-
-                    # If it's an image, also add to images list
-                    if file.type.startswith('image/'):
-                        processed_images.append(FileData(
-                            type=file.type,
-                            format=file.format,
-                            data=file.data,
-                            name=getattr(file, 'name', None)
-                        ))
-
-        if not processed_files and not component_value.get("text"):
-            return None
-
-        # Create return object with both files and images
-        return PromptReturn(
-            text=component_value.get("text"),
-            files=processed_files,
-            uuid=component_value.get("uuid")
-        )
-    else:
+    logger.debug("prompt value: %s", component_value)
+
+    # most reruns carry no new submission, so bail out before touching it
+    if not component_value:
+        return None
+    uuid = component_value.get("uuid")
+    # kept in session state rather than a module global: each browser session
+    # has its own component value, so the last uuid must be tracked per session
+    prev_uuid_key = f"chat_prompt_{key}_prev_uuid"
+    if uuid is None or uuid == st.session_state.get(prev_uuid_key):
         return None
+
+    # we have a new prompt return
+    st.session_state[prev_uuid_key] = uuid
+    text = component_value.get("text")
+    files = component_value.get("files")
+    if not files and not text:
+        return None
+
+    # The payload comes from our own frontend, so construct the models
+    # without re-validating it. Images are derived from files on access.
+    return PromptReturn.model_construct(
+        text=text,
+        files=[_file_from_component(file_data) for file_data in files or ()],
+        uuid=uuid
+    )
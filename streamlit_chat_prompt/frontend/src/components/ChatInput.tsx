@@ -287,16 +287,29 @@ export class ChatInput extends StreamlitComponentBase<State, Props> {
 
   private async setFilesFromDefault(defaultValue: PromptData) {
     if (defaultValue.files && defaultValue.files.length > 0) {
-      const processedFiles: SupportedFile[] = [];
+      // Fetch the files concurrently; Promise.all keeps the default's order,
+      // and failed fetches are dropped below
+      const fetched = await Promise.all(defaultValue.files.map(
+        async (fileData): Promise<File | null> => {
+          try {
+            const response = await fetch(fileData.url);
+            const blob = await response.blob();
+            const fileName = fileData.name || `default-file-${Math.random().toString(36).slice(2)}`;
+            return new File([blob], fileName, { type: fileData.type });
+          } catch (error) {
+            Logger.warn("files", `Failed to fetch file: ${error}`);
+            return null;
+          }
+        }
+      ));
 
-      for (const fileData of defaultValue.files) {
+      // Compress images one at a time; each decode holds a full-resolution
+      // bitmap and canvas, so doing them all at once can exhaust memory
+      const processedFiles: SupportedFile[] = [];
+      for (const file of fetched) {
+        if (!file) continue;
         try {
-          const response = await fetch(fileData.url);
-          const blob = await response.blob();
-          const fileName = fileData.name || `default-file-${Math.random().toString(36).slice(2)}`;
-          const file = new File([blob], fileName, { type: fileData.type });
-
-          if (fileData.type.startsWith('image/')) {
+          if (file.type.startsWith('image/')) {
             const processedImage = await processImage(file, this.maxImageFileSizeInBytes);
             if (processedImage) {
               processedFiles.push({
@@ -306,13 +319,13 @@ export class ChatInput extends StreamlitComponentBase<State, Props> {
                 size: processedImage.size
               });
             }
-          } else if (SUPPORTED_FILE_TYPES.PDF.includes(fileData.type)) {
+          } else if (SUPPORTED_FILE_TYPES.PDF.includes(file.type)) {
             processedFiles.push({
               file,
               type: 'pdf',
               size: file.size,
             });
-          } else if (SUPPORTED_FILE_TYPES.MARKDOWN.includes(fileData.type)) {
+          } else if (SUPPORTED_FILE_TYPES.MARKDOWN.includes(file.type)) {
             processedFiles.push({
               file,
               type: 'markdown',
@@ -636,7 +649,9 @@ export class ChatInput extends StreamlitComponentBase<State, Props> {
         const reader = new FileReader();
         reader.onloadend = () => {
           const dataString = reader.result as string;
-          const data = dataString.split(',')[1];
+          // base64 is encoded once per file, here; only the payload after the
+          // header is sliced off, without splitting the whole string
+          const data = dataString.substring(dataString.indexOf(',') + 1);
 
           resolve({
             type: file.file.type,
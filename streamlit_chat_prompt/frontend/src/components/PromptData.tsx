@@ -18,7 +18,8 @@ export class PromptData {
 
         const defaultData = props.args.default;
         const files = defaultData.files?.map((file: any) => ({
-            url: `data:${file.type};${file.format},${file.data}`,  // Construct proper data URL
+            // Python sends split fields; older versions sent a complete data URL
+            url: file.data.startsWith('data:') ? file.data : `data:${file.type};${file.format},${file.data}`,
             type: file.type,
             name: file.name || 'file'  // Use provided name or fallback
         })) || [];
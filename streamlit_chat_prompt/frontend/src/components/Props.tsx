@@ -10,7 +10,12 @@ export interface ImageFileUploadLimits extends BaseFileUploadLimits {
 export interface Props {
     default?: {
         text?: string;
-        images?: string[];
+        files?: Array<{
+            type: string;
+            format: string;
+            data: string;
+            name?: string;
+        }>;
     };
     // force_apply_default?: boolean
     image_file_upload_limits?: ImageFileUploadLimits;
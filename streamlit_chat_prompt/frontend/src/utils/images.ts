@@ -1,19 +1,18 @@
 import { Logger } from "../utils/logger";
 
+export function base64DataUrlLength(byteLength: number, mimeType: string): number {
+    const header = `data:${mimeType || "application/octet-stream"};base64,`;
+    return header.length + 4 * Math.ceil(byteLength / 3);
+}
+
 export async function checkFileSize(file: File, maxSize: number): Promise<{
     isValid: boolean;
     fileSize: number;
     base64Size: number;
 }> {
-    // Get base64 size
-    const base64Size = await new Promise<number>((resolve) => {
-        const reader = new FileReader();
-        reader.onloadend = () => {
-            const base64String = reader.result as string;
-            resolve(base64String.length);
-        };
-        reader.readAsDataURL(file);
-    });
+    // Length of the data URL readAsDataURL would produce, computed from the byte
+    // count alone instead of reading and base64-encoding the whole file
+    const base64Size = base64DataUrlLength(file.size, file.type);
 
     const fileSize = file.size;
     const isValid =
@@ -34,12 +33,19 @@ export async function checkFileSize(file: File, maxSize: number): Promise<{
     };
 }
 
-function checkValidImageDimensions(img: HTMLImageElement, maxPixelDimension: number = 8000): boolean {
+// anything drawScaled can draw: the loaded <img>, or a bitmap decoded from it
+type ImageSource = HTMLImageElement | ImageBitmap;
+
+function checkValidImageDimensions(img: ImageSource, maxPixelDimension: number = 8000): boolean {
     return img.width <= maxPixelDimension && img.height <= maxPixelDimension;
 }
 export async function processImage(file: File, maxFileSize: number, maxPixelDimension: number = 8000): Promise<File | null> {
     const img = new Image();
     const imgUrl = URL.createObjectURL(file);
+    let bitmap: ImageBitmap | null = null;
+    // one canvas for every attempt: resizing it frees the previous backing
+    // store right away, instead of leaving one per attempt for the GC
+    const canvas = document.createElement("canvas");
 
     try {
         // Wait for image to load to get dimensions
@@ -79,59 +85,64 @@ export async function processImage(file: File, maxFileSize: number, maxPixelDime
                 }
             }
 
-            // Try compression                
-            for (const quality of [1.0, 0.9, 0.8, 0.7]) {
-                Logger.debug("images", `Attempting to lower compress image with quality (${quality}) and scaling ${initialScale}`);
-                result = await compressImage(img, quality, initialScale);
-                sizeCheck = (await checkFileSize(result, maxFileSize)).isValid;
-                if (sizeCheck) {
-                    // update text if we needed to scale or not
-                    if (initialScale < 1.0) {
-                        Logger.debug("images", `Successfully compressed (${quality}) and scaled ${initialScale} image`);
-                    } else {
-                        Logger.debug("images", `Successfully compressed (${quality}) image`);
-                    }
-                    return result;
+            // Decode the pixels once up front; the compression attempts below
+            // draw the image several times, and the browser may otherwise
+            // discard and re-decode the <img> between draws. When the dimensions
+            // force a downscale anyway, resize while creating the bitmap so the
+            // full-resolution pixels are dropped and every draw reads the
+            // smaller image.
+            try {
+                if (initialScale < 1.0) {
+                    bitmap = await createImageBitmap(img, {
+                        resizeWidth: Math.round(img.width * initialScale),
+                        resizeHeight: Math.round(img.height * initialScale),
+                        resizeQuality: "high",
+                    });
+                } else {
+                    bitmap = await createImageBitmap(img);
                 }
+            } catch (err) {
+                Logger.debug("images", "Could not decode to a bitmap, drawing from the image element", err);
             }
+            const source: ImageSource = bitmap ?? img;
+            // Scales below are relative to the source; browsers may ignore the
+            // resize options, so derive it from the bitmap actually returned
+            const drawScale = bitmap ? (initialScale * img.width) / bitmap.width : initialScale;
 
-            // If we're here, compression alone didn't work
-
-            // Start with necessary dimension-based scaling (or 1.0 if no dimension issues)
-            let scale = initialScale;
-
-            // Progressive compression and scaling
-            const qualityLevels = [0.9, 0.8, 0.7, 0.6];
-
-            for (const quality of qualityLevels) {
-                // Try with current scale and this quality
-                Logger.debug("images", `Trying quality=${quality} with scale=${scale.toFixed(2)}`);
-                result = await compressImage(img, quality, scale);
-                sizeCheck = (await checkFileSize(result, maxFileSize)).isValid;
-
-                if (sizeCheck) {
-                    Logger.debug("images", "Successfully processed with quality and scale adjustments");
-                    return result;
+            // Try compression
+            let attempt = await compressToFit(source, drawScale, canvas, maxFileSize, 0.7, 1.0);
+            if (attempt.result) {
+                // update text if we needed to scale or not
+                if (initialScale < 1.0) {
+                    Logger.debug("images", `Successfully compressed and scaled ${initialScale} image`);
+                } else {
+                    Logger.debug("images", "Successfully compressed image");
                 }
+                return attempt.result;
+            }
 
-                // If file size still too big, try additional scaling at this quality level
-                let additionalScale = scale * 0.9;
-                for (let i = 0; i < 3; i++) {
-                    Logger.debug("images", `Trying additional scaling: quality=${quality}, scale=${additionalScale.toFixed(2)}`);
-                    result = await compressImage(img, quality, additionalScale);
-                    sizeCheck = (await checkFileSize(result, maxFileSize)).isValid;
+            // If we're here, compression alone didn't work
 
-                    if (sizeCheck) {
-                        Logger.debug("images", "Successfully processed with additional scaling");
-                        return result;
-                    }
+            // Start with necessary dimension-based scaling (or 1.0 if no dimension
+            // issues, or if the bitmap was already created at that size)
+            let scale = drawScale;
 
-                    additionalScale *= 0.7; // More aggressive scaling reduction
+            // JPEG size is roughly proportional to pixel count, so estimate the
+            // scale that fits from how far over the limit the last attempt was,
+            // rather than stepping down and re-encoding at each step
+            const targetBytes = (maxFileSize * 3) / 4; // maxFileSize applies to base64
+            for (let i = 0; i < 3; i++) {
+                scale *= Math.min(0.9, 0.95 * Math.sqrt(targetBytes / attempt.size));
+                Logger.debug("images", `Trying estimated scale=${scale.toFixed(2)}`);
+                attempt = await compressToFit(source, scale, canvas, maxFileSize, 0.6, 0.9);
+                if (attempt.result) {
+                    Logger.debug("images", "Successfully processed with quality and scale adjustments");
+                    return attempt.result;
                 }
             }
 
             // Last resort: try extreme compression and scaling
-            result = await compressImage(img, 0.5, scale * 0.5);
+            result = await encodeJpeg(drawScaled(source, scale * 0.5, canvas), 0.5);
             sizeCheck = (await checkFileSize(result, maxFileSize)).isValid;
             if (sizeCheck) {
                 Logger.debug("images", "Successfully compressed with extreme settings");
@@ -148,28 +159,78 @@ export async function processImage(file: File, maxFileSize: number, maxPixelDime
         Logger.error("images", "Error processing image", err);
         throw err;
     } finally {
+        bitmap?.close();
+        canvas.width = canvas.height = 0;
         URL.revokeObjectURL(imgUrl);
     }
 }
 
-export async function compressImage(
-    img: HTMLImageElement,
-    quality: number,
-    scale: number
-): Promise<File> {
-    const canvas = document.createElement("canvas");
+// JPEG size grows with quality, so try the best quality first and otherwise
+// bisect for the highest quality that fits, instead of stepping down one
+// quality level (and one encode) at a time.
+// Also returns the size at minQuality, which callers use to estimate scaling.
+async function compressToFit(
+    img: ImageSource,
+    scale: number,
+    canvas: HTMLCanvasElement,
+    maxFileSize: number,
+    minQuality: number,
+    maxQuality: number,
+    steps: number = 3
+): Promise<{ result: File | null; size: number }> {
+    Logger.debug("images", `Searching quality ${minQuality}-${maxQuality} with scaling ${scale}`);
+    // draw once at this scale; every quality attempt re-encodes the same canvas
+    drawScaled(img, scale, canvas);
+    const top = await encodeJpeg(canvas, maxQuality);
+    if ((await checkFileSize(top, maxFileSize)).isValid) {
+        return { result: top, size: top.size };
+    }
+
+    let best = await encodeJpeg(canvas, minQuality);
+    const size = best.size;
+    if (!(await checkFileSize(best, maxFileSize)).isValid) {
+        return { result: null, size };
+    }
+
+    let low = minQuality;
+    let high = maxQuality;
+    for (let i = 0; i < steps; i++) {
+        const quality = (low + high) / 2;
+        const result = await encodeJpeg(canvas, quality);
+        if ((await checkFileSize(result, maxFileSize)).isValid) {
+            best = result;
+            low = quality;
+        } else {
+            high = quality;
+        }
+    }
+    return { result: best, size };
+}
+
+function drawScaled(
+    img: ImageSource,
+    scale: number,
+    canvas: HTMLCanvasElement
+): HTMLCanvasElement {
     const ctx = canvas.getContext("2d")!;
 
     canvas.width = img.width * scale;
     canvas.height = img.height * scale;
-    Logger.debug("images", "Compressing image:", {
-        quality,
+    Logger.debug("images", "Scaling image:", {
         scale,
+        inputDimensions: `${img.width}x${img.height}`,
         canvasDimensions: `${canvas.width}x${canvas.height}`,
     });
 
+    // JPEG has no alpha: flatten transparency onto white as part of the one
+    // draw, rather than letting the encoder turn it black
+    ctx.fillStyle = "#ffffff";
+    ctx.fillRect(0, 0, canvas.width, canvas.height);
     ctx.drawImage(img, 0, 0, canvas.width, canvas.height);
+    return canvas;
+}
 
+async function encodeJpeg(canvas: HTMLCanvasElement, quality: number): Promise<File> {
     const blob = await new Promise<Blob>((resolve) => {
         canvas.toBlob(
             (blob) => {
@@ -186,10 +247,8 @@ export async function compressImage(
 
     const result = new File([blob], "compressed.jpg", { type: "image/jpeg" });
     Logger.debug("images", "Compression complete:", {
-        inputDimensions: `${img.width}x${img.height}`,
         outputDimensions: `${canvas.width}x${canvas.height}`,
         quality,
-        scale,
         finalSize: `${(result.size / 1024 / 1024).toFixed(2)}MB`,
     });
 